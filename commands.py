@@ -6,6 +6,7 @@ The assignment requires 'ls' and 'cd' to be implemented as stubs
 that print their own name and arguments.
 """
 
+import sys
 from typing import List
 
 
@@ -16,7 +17,7 @@ def cmd_ls(args: List[str]) -> None:
     For Stage 1/2 it does not list any real files.
     It simply prints its name and arguments.
     """
-    print(f"[ls] arguments: {args}")
+    sys.stdout.write(f"[ls] arguments: {args}\n")
 
 
 def cmd_cd(args: List[str]) -> None:
@@ -26,4 +27,4 @@ def cmd_cd(args: List[str]) -> None:
     For Stage 1/2 it does not change any real directory.
     It simply prints its name and arguments.
     """
-    print(f"[cd] arguments: {args}")
+    sys.stdout.write(f"[cd] arguments: {args}\n")
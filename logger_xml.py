@@ -9,16 +9,54 @@ Each logged event contains:
 - arguments
 - whether it succeeded
 - optional error message
+
+The log file is written incrementally: the XML header is written once when
+the file is created, each event is appended as a serialized `<event>`
+fragment, and the closing `</log>` tag is written when the logger is closed.
+
+Events have a fixed structure, so they are formatted from a bytes template
+rather than built as an ElementTree and serialized.
 """
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+import atexit
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import BinaryIO, Iterator, List, Optional
+
+
+_BUFFER_SIZE = 64 * 1024
+
+_HEADER = b'<?xml version="1.0" encoding="utf-8"?>\n<log>\n'
+_TRAILER = b"</log>\n"
+_ROOT_END_TAG = b"</log>"
+
+_EVENT_TEMPLATE = (
+    b"<event><username>%b</username><timestamp>%b</timestamp>"
+    b"<command>%b</command><args>%b</args><success>%b</success>%b</event>\n"
+)
+
+# Same escaping ElementTree applies to element text.
+_XML_ESCAPES = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
 
-import xml.etree.ElementTree as ET
+# How many bytes from the end of an existing log file are searched
+# for the closing root tag when the file is reopened.
+_TAIL_SEARCH_SIZE = 4096
+
+# Events are buffered in memory and the file is flushed (made well-formed
+# on disk) after this many of them.
+_FLUSH_EVERY = 64
+
+
+def _xml_escape(text: str) -> bytes:
+    """
+    Escape `text` for use as XML element content and encode it as UTF-8.
+    """
+    return text.translate(_XML_ESCAPES).encode("utf-8")
 
 
 @dataclass
@@ -28,7 +66,7 @@ class CommandEvent:
     args: List[str]
     success: bool
     error_message: Optional[str] = None
-    timestamp: datetime = datetime.now()
+    timestamp: datetime = field(default_factory=datetime.now)
 
 
 class CommandLogger:
@@ -36,11 +74,22 @@ class CommandLogger:
     Simple XML logger that appends command events to a log file.
 
     If log_path is None, logging is disabled.
+
+    The file is opened lazily on the first logged event and kept open
+    until close() is called (or the interpreter exits). Writes are
+    buffered; the file is flushed every _FLUSH_EVERY events and is only
+    guaranteed to be well-formed XML after flush() or close().
     """
 
     def __init__(self, log_path: Optional[Path], username: str) -> None:
         self.log_path = log_path
         self.username = username
+        self._fh: Optional[BinaryIO] = None
+        self._parent_created = False
+        # Events written since the last flush()
+        self._unflushed = 0
+        # Events collected inside a batch() block, None outside of it
+        self._pending: Optional[List[CommandEvent]] = None
 
     def log(
         self,
@@ -63,50 +112,159 @@ class CommandLogger:
             args=args,
             success=success,
             error_message=error_message,
-            timestamp=datetime.now(),
         )
 
-        self._append_event(event)
+        if self._pending is not None:
+            self._pending.append(event)
+        else:
+            self._append_event(event)
 
-    def _append_event(self, event: CommandEvent) -> None:
+    def log_batch(self, events: List[CommandEvent]) -> None:
         """
-        Append an event to the XML log file, creating it if necessary.
+        Append several events with a single write and flush the log file.
+        """
+        if self.log_path is None or not events:
+            return
+
+        fh = self._fh
+        if fh is None:
+            fh = self._open()
+
+        fh.write(b"".join(self._serialize_event(event) for event in events))
+        self.flush()
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """
+        Collect events logged inside the `with` block in memory and write
+        them all at once with log_batch() when the block exits.
+        """
+        if self._pending is not None:
+            # Already batching; the outer block writes everything.
+            yield
+            return
+
+        self._pending = []
+        try:
+            yield
+        finally:
+            events, self._pending = self._pending, None
+            self.log_batch(events)
+
+    def flush(self) -> None:
+        """
+        Make the log file on disk well-formed without closing it.
+
+        The closing tag is written and flushed, then the write position is
+        moved back so that the next event overwrites it.
+        """
+        fh = self._fh
+        if fh is None:
+            return
+
+        fh.write(_TRAILER)
+        fh.flush()
+        fh.seek(-len(_TRAILER), os.SEEK_CUR)
+        self._unflushed = 0
+
+    def close(self) -> None:
+        """
+        Write the closing `</log>` tag and close the log file.
+
+        Safe to call multiple times; a later log() call reopens the file.
+        """
+        fh = self._fh
+        if fh is None:
+            return
+
+        self._fh = None
+        atexit.unregister(self.close)
+
+        fh.write(_TRAILER)
+        fh.truncate()
+        fh.close()
+
+    def _open(self) -> BinaryIO:
+        """
+        Open the log file for appending, creating it if necessary.
+
+        If the file already contains a log, its closing tag is removed
+        so that new events are appended inside the existing root element.
         """
         log_path = self.log_path
         assert log_path is not None  # for type checkers
 
-        # Make sure the directory exists.
-        if log_path.parent:
-            log_path.parent.mkdir(parents=True, exist_ok=True)
+        # Make sure the directory exists (only checked once per logger).
+        # Path("log.xml").parent is Path("."), which always exists.
+        if not self._parent_created:
+            parent = log_path.parent
+            if parent != Path("."):
+                parent.mkdir(parents=True, exist_ok=True)
+            self._parent_created = True
 
-        if log_path.exists():
-            tree = ET.parse(log_path)
-            root = tree.getroot()
+        if log_path.exists() and log_path.stat().st_size > 0:
+            fh = log_path.open("r+b", buffering=_BUFFER_SIZE)
+            fh.seek(self._find_root_end(fh))
+            fh.truncate()
         else:
-            root = ET.Element("log")
-            tree = ET.ElementTree(root)
+            fh = log_path.open("wb", buffering=_BUFFER_SIZE)
+            fh.write(_HEADER)
 
-        event_elem = ET.SubElement(root, "event")
+        self._fh = fh
+        atexit.register(self.close)
+        return fh
 
-        username_elem = ET.SubElement(event_elem, "username")
-        username_elem.text = event.username
+    @staticmethod
+    def _find_root_end(fh: BinaryIO) -> int:
+        """
+        Return the offset of the closing `</log>` tag in an existing log file.
+
+        If there is no closing tag (e.g. the previous session was killed
+        before close()), the end of the file is returned.
+        """
+        size = fh.seek(0, os.SEEK_END)
+        start = max(0, size - _TAIL_SEARCH_SIZE)
+        fh.seek(start)
+        tail = fh.read()
 
-        timestamp_elem = ET.SubElement(event_elem, "timestamp")
-        timestamp_elem.text = event.timestamp.isoformat()
+        pos = tail.rfind(_ROOT_END_TAG)
+        if pos == -1:
+            return size
+        return start + pos
 
-        command_elem = ET.SubElement(event_elem, "command")
-        command_elem.text = event.command
+    def _append_event(self, event: CommandEvent) -> None:
+        """
+        Append an event to the XML log file, creating it if necessary.
+        """
+        fh = self._fh
+        if fh is None:
+            fh = self._open()
 
-        args_elem = ET.SubElement(event_elem, "args")
-        for arg in event.args:
-            arg_elem = ET.SubElement(args_elem, "arg")
-            arg_elem.text = arg
+        fh.write(self._serialize_event(event))
 
-        success_elem = ET.SubElement(event_elem, "success")
-        success_elem.text = "true" if event.success else "false"
+        self._unflushed += 1
+        if self._unflushed >= _FLUSH_EVERY:
+            self.flush()
 
+    @staticmethod
+    def _serialize_event(event: CommandEvent) -> bytes:
+        """
+        Serialize an event as a single `<event>` line.
+        """
         if event.error_message:
-            error_elem = ET.SubElement(event_elem, "error")
-            error_elem.text = event.error_message
+            error_xml = b"<error>" + _xml_escape(event.error_message) + b"</error>"
+        else:
+            error_xml = b""
 
-        tree.write(log_path, encoding="utf-8", xml_declaration=True)
+        args_xml = b"".join(
+            [b"<arg>" + _xml_escape(arg) + b"</arg>" for arg in event.args]
+        )
+
+        return _EVENT_TEMPLATE % (
+            _xml_escape(event.username),
+            event.timestamp.isoformat().encode("ascii"),
+            _xml_escape(event.command),
+            args_xml,
+            b"true" if event.success else b"false",
+            error_xml,
+        )
@@ -12,15 +12,23 @@ from __future__ import annotations
 
 import argparse
 from pathlib import Path
+from typing import Optional
 
 from config import AppConfig
 from shell import Shell
 
 
-def parse_args() -> AppConfig:
+_PARSER: Optional[argparse.ArgumentParser] = None
+
+
+def _get_parser() -> argparse.ArgumentParser:
     """
-    Parse command-line arguments and build an AppConfig instance.
+    Build the argument parser on first use and reuse it afterwards.
     """
+    global _PARSER
+    if _PARSER is not None:
+        return _PARSER
+
     parser = argparse.ArgumentParser(
         description="Shell emulator (Stage 3, Variant 27)."
     )
@@ -44,6 +52,15 @@ def parse_args() -> AppConfig:
         help="Path to the startup script that will be executed before interactive mode.",
     )
 
+    _PARSER = parser
+    return parser
+
+
+def parse_args() -> AppConfig:
+    """
+    Parse command-line arguments and build an AppConfig instance.
+    """
+    parser = _get_parser()
     args = parser.parse_args()
 
     return AppConfig(
@@ -7,13 +7,86 @@ Responsibilities:
 - Correctly handle quoted arguments (both single and double quotes).
 
 Implementation detail:
-- Uses Python's `shlex.split`, which behaves similarly to a POSIX shell.
+- Lines without quotes or backslashes are split on whitespace directly.
+- Everything else goes through a small hand-written tokenizer that follows
+  the rules of `shlex.split(line, posix=True)`, which behaves similarly to
+  a POSIX shell.
 """
 
-import shlex
+import sys
 from typing import List, Tuple
 
 
+# Characters that require the full tokenizer.
+_QUOTECHARS = frozenset("\"'\\")
+
+# Same whitespace set as shlex.
+_WHITESPACE = frozenset(" \t\r\n")
+
+# Maps the other shlex whitespace characters to a space, so that the fast
+# path can split on " " only (str.split() with no argument would also split
+# on \x0b, \x0c, NBSP and other Unicode whitespace).
+_WHITESPACE_TO_SPACE = str.maketrans("\t\r\n", "   ")
+
+
+def _tokenize(line: str) -> List[str]:
+    """
+    Split a line like `shlex.split(line, posix=True)`, in a single pass.
+
+    - Whitespace separates tokens.
+    - Single quotes keep everything literally.
+    - Inside double quotes a backslash only escapes '"' and '\\'.
+    - Outside quotes a backslash escapes any character.
+    - Quoted parts join the surrounding token; '' yields an empty token.
+
+    Raises:
+        ValueError: "No closing quotation" / "No escaped character",
+        with the same messages as shlex.
+    """
+    tokens: List[str] = []
+    token: List[str] = []  # characters of the current token
+    in_token = False  # True once a token started (it may still be empty: '')
+    quote = ""  # the open quote character, "" outside quotes
+
+    chars = iter(line)
+    for ch in chars:
+        if quote:
+            if ch == quote:
+                quote = ""
+            elif ch == "\\" and quote == '"':
+                escaped = next(chars, None)
+                if escaped is None:
+                    raise ValueError("No escaped character")
+                if escaped != "\\" and escaped != '"':
+                    token.append(ch)
+                token.append(escaped)
+            else:
+                token.append(ch)
+        elif ch in _WHITESPACE:
+            if in_token:
+                tokens.append("".join(token))
+                token.clear()
+                in_token = False
+        elif ch == "'" or ch == '"':
+            quote = ch
+            in_token = True
+        elif ch == "\\":
+            escaped = next(chars, None)
+            if escaped is None:
+                raise ValueError("No escaped character")
+            token.append(escaped)
+            in_token = True
+        else:
+            token.append(ch)
+            in_token = True
+
+    if quote:
+        raise ValueError("No closing quotation")
+    if in_token:
+        tokens.append("".join(token))
+    return tokens
+
+
 def parse_command_line(line: str) -> Tuple[str, List[str]]:
     """
     Parse a line into (command, args).
@@ -26,15 +99,22 @@ def parse_command_line(line: str) -> Tuple[str, List[str]]:
     Raises:
         ValueError: if parsing fails (e.g. unmatched quote).
     """
-    try:
-        tokens: List[str] = shlex.split(line, posix=True)
-    except ValueError as e:
-        # e.g. "No closing quotation"
-        raise ValueError(f"failed to parse command line: {e}") from e
+    tokens: List[str]
+    if _QUOTECHARS.isdisjoint(line):
+        # Fast path: nothing to unquote, so splitting on the tokenizer's
+        # whitespace set (and dropping empty parts) gives the same result.
+        tokens = [t for t in line.translate(_WHITESPACE_TO_SPACE).split(" ") if t]
+    else:
+        try:
+            tokens = _tokenize(line)
+        except ValueError as e:
+            # e.g. "No closing quotation"
+            raise ValueError(f"failed to parse command line: {e}") from e
 
     if not tokens:
         raise ValueError("empty command")
 
-    command = tokens[0]
+    # Interned so the dispatcher's dict lookup can match by identity.
+    command = sys.intern(tokens[0])
     args = tokens[1:]
     return command, args
@@ -25,9 +25,12 @@ Stage 4:
 from __future__ import annotations
 
 import getpass
+import os
 import socket
+import sys
+from itertools import groupby
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional
 
 from parser import parse_command_line
 from config import AppConfig
@@ -35,6 +38,17 @@ from logger_xml import CommandLogger
 from vfs import Vfs, VfsLoadError, VfsSaveError
 
 
+# Real OS data does not change while the process runs, so it is looked up
+# once at import time. SHELL_EMU_USER / SHELL_EMU_HOST override it (handy
+# for tests and demos).
+_USERNAME: str = os.environ.get("SHELL_EMU_USER") or getpass.getuser()
+_HOSTNAME: str = os.environ.get("SHELL_EMU_HOST") or socket.gethostname()
+
+
+def _noop_log(*args: object, **kwargs: object) -> None:
+    """Stand-in for CommandLogger.log when no log file is configured."""
+
+
 class Shell:
     """
     Shell emulator for Stage 4.
@@ -45,16 +59,35 @@ class Shell:
         self.config = config
 
         # Real OS data
-        self.username: str = getpass.getuser()
-        self.hostname: str = socket.gethostname()
+        self.username: str = _USERNAME
+        self.hostname: str = _HOSTNAME
+
+        # The user/host part of the prompt never changes
+        self._prompt_prefix: str = f"{self.username}@{self.hostname}:"
+        self._prompt: str = ""
 
         # Logical "current directory" within the VFS (absolute path)
-        self.current_dir: str = "/"  # will be shown as '~' in the prompt
+        self.current_dir = "/"  # will be shown as '~' in the prompt
 
         self._running: bool = True
 
+        # Command name -> handler(args) -> (success, error_message)
+        self._commands: Dict[str, Callable[[List[str]], Tuple[bool, Optional[str]]]] = {
+            "exit": self._handle_exit,
+            "ls": self._handle_ls,
+            "cd": self._handle_cd,
+            "clear": self._handle_clear,
+            "uniq": self._handle_uniq,
+            "du": self._handle_du,
+            "vfs-save": self._handle_vfs_save,
+        }
+
         # XML logger for command events
         self.logger = CommandLogger(config.log_path, self.username)
+        # With logging disabled, commands skip the logger call entirely
+        self._log: Callable[..., None] = (
+            self.logger.log if config.log_path is not None else _noop_log
+        )
 
         # In-memory VFS (initially empty)
         self.vfs: Vfs = Vfs()
@@ -95,32 +128,50 @@ class Shell:
 
     # ------------- Prompt & main loop -------------
 
+    @property
+    def current_dir(self) -> str:
+        return self._current_dir
+
+    @current_dir.setter
+    def current_dir(self, value: str) -> None:
+        # The prompt only depends on current_dir, so rebuild it here
+        # instead of on every REPL iteration.
+        self._current_dir = value
+        # Path components of current_dir, used by _make_abs_path
+        self._current_parts: List[str] = [p for p in value.split("/") if p]
+        if value == "/":
+            path_display = "~"
+        else:
+            path_display = value
+        self._prompt = f"{self._prompt_prefix}{path_display}$ "
+
     def build_prompt(self) -> str:
         """
-        Build the prompt string, e.g.:
+        Return the prompt string, e.g.:
 
             username@hostname:~$
 
         We display '/' as '~' to mimic a typical Unix home directory prompt.
         """
-        if self.current_dir == "/":
-            path_display = "~"
-        else:
-            path_display = self.current_dir
-        return f"{self.username}@{self.hostname}:{path_display}$ "
+        return self._prompt
 
     def run(self) -> None:
         """
         Run the shell:
         - Execute the startup script if configured.
         - Enter the interactive REPL loop.
+        - Close the XML log when the shell terminates.
         """
-        # 1) Run startup script if provided
-        if self.config.startup_script is not None:
-            self._run_startup_script(self.config.startup_script)
+        try:
+            # 1) Run startup script if provided
+            if self.config.startup_script is not None:
+                self._run_startup_script(self.config.startup_script)
 
-        # 2) Interactive REPL
-        self._run_interactive_loop()
+            # 2) Interactive REPL
+            self._run_interactive_loop()
+        finally:
+            # Write the closing tag of the XML log
+            self.logger.close()
 
     def _run_interactive_loop(self) -> None:
         while self._running:
@@ -147,6 +198,7 @@ class Shell:
         - Empty lines are ignored.
         - Each command line is printed with a prompt to imitate user input.
         - Errors during script execution are reported.
+        - Log events are buffered and written to the XML log once at the end.
         """
         if not script_path.exists():
             print(f"Error: startup script '{script_path}' not found.")
@@ -155,24 +207,28 @@ class Shell:
         print(f"Running startup script: {script_path}")
 
         try:
-            content = script_path.read_text(encoding="utf-8")
+            script_file = script_path.open("r", encoding="utf-8")
         except OSError as e:
             print(f"Error: could not read startup script '{script_path}': {e}")
             return
 
-        for line_no, raw_line in enumerate(content.splitlines(), start=1):
-            line = raw_line.rstrip("\n")
+        # The script is streamed line by line instead of being read into memory.
+        # Log events of the whole script are written in one batch at the end.
+        with script_file, self.logger.batch():
+            for line_no, raw_line in enumerate(script_file, start=1):
+                # One scan of the raw line detects both blank lines and comments
+                content = raw_line.lstrip()
+                if not content or content[0] == "#":
+                    # Comment or empty line - just skip
+                    continue
 
-            stripped = line.strip()
-            if not stripped or stripped.startswith("#"):
-                # Comment or empty line - just skip
-                continue
+                line = raw_line.rstrip("\r\n")
 
-            # Show the command as if the user typed it
-            print(self.build_prompt() + line)
+                # Show the command as if the user typed it
+                sys.stdout.write(self._prompt + line + "\n")
 
-            # Process the line; any errors will be printed by the parser/dispatcher
-            self._process_line(line, from_script=True, script_line_no=line_no)
+                # Process the line; any errors will be printed by the parser/dispatcher
+                self._process_line(line, from_script=True, script_line_no=line_no)
 
     # ------------- Command processing -------------
 
@@ -199,7 +255,7 @@ class Shell:
             else:
                 print(f"Error: {error_msg}")
             # Log parse failure with a pseudo-command name
-            self.logger.log(
+            self._log(
                 command="(parse-error)",
                 args=[line],
                 success=False,
@@ -223,30 +279,19 @@ class Shell:
         - vfs-save  : save current VFS to CSV
         - exit      : terminate the shell
         """
-        success = True
-        error_message: Optional[str] = None
-
-        if command == "exit":
-            success, error_message = self._handle_exit(args)
-        elif command == "ls":
-            success, error_message = self._handle_ls(args)
-        elif command == "cd":
-            success, error_message = self._handle_cd(args)
-        elif command == "clear":
-            success, error_message = self._handle_clear(args)
-        elif command == "uniq":
-            success, error_message = self._handle_uniq(args)
-        elif command == "du":
-            success, error_message = self._handle_du(args)
-        elif command == "vfs-save":
-            success, error_message = self._handle_vfs_save(args)
-        else:
+        success: bool
+        error_message: Optional[str]
+
+        handler = self._commands.get(command)
+        if handler is None:
             error_message = f"unknown command '{command}'"
             print(f"Error: {error_message}")
             success = False
+        else:
+            success, error_message = handler(args)
 
         # Log the command (including failures)
-        self.logger.log(
+        self._log(
             command=command,
             args=args,
             success=success,
@@ -304,9 +349,13 @@ class Shell:
 
             if node.is_dir:
                 entries = self.vfs.list_dir(abs_path)
-                for entry in entries:
-                    suffix = "/" if entry.is_dir else ""
-                    print(entry.name + suffix)
+                # One write for the whole listing instead of a print() per entry
+                out = "\n".join(
+                    entry.name + "/" if entry.is_dir else entry.name
+                    for entry in entries
+                )
+                if out:
+                    sys.stdout.write(out + "\n")
             else:
                 # If it's a file, just print its name
                 print(node.name)
@@ -395,15 +444,21 @@ class Shell:
             print(msg)
             return False, f"not a file: {abs_path}"
 
+        # File content is decoded from base64 lazily, on first access
+        try:
+            content = node.content
+        except VfsLoadError as e:
+            print(f"Error: {e}")
+            return False, str(e)
+
         # Decode file content as text, best-effort
-        text = node.content.decode("utf-8", errors="replace")
+        text = content.decode("utf-8", errors="replace")
         lines = text.splitlines()
 
-        last_line: Optional[str] = None
-        for line in lines:
-            if line != last_line:
-                print(line)
-                last_line = line
+        # groupby() yields one key per run of equal adjacent lines
+        if lines:
+            out = "\n".join(line for line, _ in groupby(lines))
+            sys.stdout.write(out + "\n")
 
         return True, None
 
@@ -431,7 +486,7 @@ class Shell:
 
         try:
             size = self.vfs.compute_size(abs_path)
-        except FileNotFoundError as e:
+        except (FileNotFoundError, VfsLoadError) as e:
             print(f"Error: {e}")
             return False, str(e)
 
@@ -472,27 +527,20 @@ class Shell:
             - relative paths from current_dir: "docs/readme.txt"
             - '.', '..'
         """
+        # Single pass over the path, starting from the cached parts of current_dir
         if path.startswith("/"):
-            base_parts: List[str] = []
-            tail = path.lstrip("/")
+            parts: List[str] = []
         else:
-            # Start from current_dir
-            if self.current_dir == "/":
-                base_parts = []
-            else:
-                base_parts = [p for p in self.current_dir.lstrip("/").split("/") if p]
-            tail = path
+            parts = self._current_parts.copy()
 
-        for part in tail.split("/"):
+        for part in path.split("/"):
             if part == "" or part == ".":
                 continue
             if part == "..":
-                if base_parts:
-                    base_parts.pop()
+                if parts:
+                    parts.pop()
                 # if already at root, stay there
             else:
-                base_parts.append(part)
+                parts.append(part)
 
-        if not base_parts:
-            return "/"
-        return "/" + "/".join(base_parts)
+        return "/" + "/".join(parts)
@@ -16,10 +16,15 @@ Stage 4:
 from __future__ import annotations
 
 import base64
+import binascii
 import csv
-from dataclasses import dataclass, field
+import io
+import mmap
+import os
+import stat
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 
 
 class VfsLoadError(Exception):
@@ -30,12 +35,151 @@ class VfsSaveError(Exception):
     """Raised when the VFS cannot be saved to disk."""
 
 
-@dataclass
+class _TreeState:
+    """
+    State shared by all nodes of one tree.
+
+    `version` is bumped whenever a child is added or replaced anywhere in
+    the tree, so caches over the whole tree (the Vfs path index) can tell
+    that they are stale.
+    """
+
+    __slots__ = ("version",)
+
+    def __init__(self) -> None:
+        self.version = 0
+
+
 class VfsNode:
-    name: str
-    is_dir: bool
-    children: Dict[str, "VfsNode"] = field(default_factory=dict)
-    content: bytes = b""  # only used if is_dir == False
+    """
+    A directory or file in the VFS tree.
+
+    Besides name, type, children and content, a node holds caches and a
+    parent back-pointer; these are plain slots rather than record fields,
+    so they stay out of repr and equality.
+    """
+
+    __slots__ = (
+        "name",
+        "is_dir",
+        "children",
+        # File content (only used if is_dir == False), see the `content`
+        # property. None means "not decoded from _content_b64 yet".
+        "_content",
+        # base64 form of the content: the text loaded from CSV, or filled
+        # in on first save
+        "_content_b64",
+        # Sorted child names, reset whenever a new child name is added
+        "_sorted_child_names",
+        # Containing directory (None for the root)
+        "parent",
+        # Recursive size in bytes, computed by du and reset on changes below
+        "_size",
+        # Shared by every node of the tree; children inherit it from the parent
+        "_tree",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        is_dir: bool,
+        children: Optional[Dict[str, "VfsNode"]] = None,
+        content: Optional[bytes] = b"",
+        content_b64: Optional[str] = None,
+        parent: Optional["VfsNode"] = None,
+    ) -> None:
+        """
+        `content` may be None for a file whose content is only known as
+        base64 text (`content_b64`); it is then decoded on first access.
+        """
+        self.name = name
+        self.is_dir = is_dir
+        self.children: Dict[str, VfsNode] = {} if children is None else children
+        self._content = content
+        self._content_b64 = content_b64
+        self._sorted_child_names: Optional[List[str]] = None
+        self.parent = parent
+        self._size: Optional[int] = None
+        self._tree = _TreeState() if parent is None else parent._tree
+
+    def __repr__(self) -> str:
+        return (
+            f"VfsNode(name={self.name!r}, is_dir={self.is_dir!r}, "
+            f"children={self.children!r})"
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, VfsNode):
+            return NotImplemented
+        if self.name != other.name or self.is_dir != other.is_dir:
+            return False
+        if self.is_dir:
+            return self.children == other.children
+        if (
+            self._content is None
+            and other._content is None
+            and self._content_b64 == other._content_b64
+        ):
+            # Same text, no need to decode either side
+            return True
+        # Compare the decoded content, so a lazily loaded file equals an
+        # eagerly created one with the same bytes. Content that cannot be
+        # decoded only equals the same undecoded text (handled above).
+        try:
+            return self.content == other.content
+        except VfsLoadError:
+            return False
+
+    @property
+    def content(self) -> bytes:
+        """
+        File content, decoded from the base64 text on first access.
+
+        Raises:
+            VfsLoadError if the base64 text loaded from CSV is invalid.
+        """
+        content = self._content
+        if content is None:
+            try:
+                content = binascii.a2b_base64(self._content_b64 or "")
+            except ValueError as e:  # binascii.Error or non-ASCII input
+                raise VfsLoadError(
+                    f"Invalid base64 content for '{self._abs_path()}': {e}"
+                ) from e
+            self._content = content
+        return content
+
+    @content.setter
+    def content(self, value: bytes) -> None:
+        self._content = value
+        self._content_b64 = None
+        self._invalidate_size()
+
+    def content_size(self) -> int:
+        """
+        Size of the file content in bytes.
+
+        Content that has not been decoded yet is decoded only to measure
+        it and is not kept in memory.
+        """
+        if self._content is not None:
+            return len(self._content)
+        try:
+            return len(binascii.a2b_base64(self._content_b64 or ""))
+        except ValueError:
+            # Let the `content` property produce the proper error
+            return len(self.content)
+
+    def _abs_path(self) -> str:
+        """
+        Absolute path of this node, built from the parent links.
+        """
+        names: List[str] = []
+        node: Optional[VfsNode] = self
+        while node is not None and node.parent is not None:
+            names.append(node.name)
+            node = node.parent
+        return "/" + "/".join(reversed(names))
 
     def ensure_child_dir(self, name: str) -> "VfsNode":
         """
@@ -50,15 +194,62 @@ class VfsNode:
                 )
             return node
 
-        node = VfsNode(name=name, is_dir=True)
+        node = VfsNode(name=name, is_dir=True, parent=self)
         self.children[name] = node
+        self._sorted_child_names = None
+        self._tree.version += 1
+        self._invalidate_size()
         return node
 
-    def set_file(self, name: str, content: bytes) -> None:
+    def set_file(
+        self,
+        name: str,
+        content: Optional[bytes],
+        content_b64: Optional[str] = None,
+    ) -> None:
         """
         Create or overwrite a file child with the given name and content.
+
+        `content_b64`, if given, must be a base64 encoding of the content; it
+        is kept as the node's cached encoding and written back by to_csv.
+        If `content` is None, it is decoded from `content_b64` on first use.
         """
-        self.children[name] = VfsNode(name=name, is_dir=False, content=content)
+        if name not in self.children:
+            self._sorted_child_names = None
+        self.children[name] = VfsNode(
+            name=name,
+            is_dir=False,
+            content=content,
+            content_b64=content_b64,
+            parent=self,
+        )
+        self._tree.version += 1
+        self._invalidate_size()
+
+    def _invalidate_size(self) -> None:
+        """
+        Drop the cached size of this node and all of its ancestors.
+
+        A cached size on a directory implies cached sizes on everything
+        below it, so the walk can stop at the first node without one.
+        """
+        node: Optional[VfsNode] = self
+        while node is not None and node._size is not None:
+            node._size = None
+            node = node.parent
+
+    def sorted_child_names(self) -> List[str]:
+        """
+        Return the names of all children in sorted order.
+
+        The sorted list is cached until a new child is added; callers
+        must not modify it.
+        """
+        names = self._sorted_child_names
+        if names is None:
+            names = sorted(self.children)
+            self._sorted_child_names = names
+        return names
 
 
 class Vfs:
@@ -70,6 +261,11 @@ class Vfs:
         # Root directory
         self.root = VfsNode(name="/", is_dir=True)
 
+        # Absolute path -> node index used by find_node, valid for the
+        # tree version it was built at (see _index)
+        self._by_path: Dict[str, VfsNode] = {}
+        self._indexed_version = -1
+
     # ----------- Stage 3: load/save CSV -----------
 
     @classmethod
@@ -86,24 +282,37 @@ class Vfs:
         vfs = cls()
 
         try:
-            with path.open("r", encoding="utf-8", newline="") as f:
-                reader = csv.DictReader(f)
+            with Vfs._mapped_lines(path) as lines:
+                reader = csv.reader(lines)
+                # Directory chain of the previous row, shared between rows
+                dir_stack: List[Tuple[str, VfsNode]] = [("", vfs.root)]
+                header = next(reader, [])
                 required_fields = {"path", "type", "content_base64"}
-                if not required_fields.issubset(reader.fieldnames or []):
+                if not required_fields.issubset(header):
                     raise VfsLoadError(
                         f"VFS CSV '{path}' has invalid header. "
                         f"Expected fields: {sorted(required_fields)}"
                     )
 
+                # Column positions are resolved once instead of per row
+                p_idx = header.index("path")
+                t_idx = header.index("type")
+                c_idx = header.index("content_base64")
+
                 for row in reader:
-                    raw_path = (row.get("path") or "").strip()
-                    node_type = (row.get("type") or "").strip()
-                    content_b64 = row.get("content_base64") or ""
+                    if not row:
+                        # Blank line (csv.DictReader skipped these too)
+                        continue
+
+                    n = len(row)
+                    raw_path = row[p_idx].strip() if p_idx < n else ""
+                    node_type = row[t_idx].strip() if t_idx < n else ""
+                    content_b64 = row[c_idx] if c_idx < n else ""
 
                     if not raw_path:
                         raise VfsLoadError("Empty 'path' field in VFS CSV")
 
-                    Vfs._insert_row(vfs.root, raw_path, node_type, content_b64)
+                    Vfs._insert_row(dir_stack, raw_path, node_type, content_b64)
         except VfsLoadError:
             # re-raise as is
             raise
@@ -112,6 +321,35 @@ class Vfs:
 
         return vfs
 
+    @staticmethod
+    @contextmanager
+    def _mapped_lines(path: Path) -> Iterator[Iterator[str]]:
+        """
+        Yield an iterator over the decoded lines of a UTF-8 file.
+
+        Regular, non-empty files are memory-mapped: lines are split on '\n'
+        directly in the mapping (as written by to_csv, which ends rows with
+        '\r\n') and decoded one at a time, which is faster than reading
+        through a text-mode file object. Anything that cannot be mapped
+        (empty files, pipes and other special files) is read through a
+        text-mode file object instead.
+        """
+        with path.open("rb") as f:
+            st = os.fstat(f.fileno())
+            mm: Optional[mmap.mmap] = None
+            if stat.S_ISREG(st.st_mode) and st.st_size:
+                try:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (ValueError, OSError):
+                    mm = None
+            if mm is not None:
+                with mm:
+                    yield (line.decode("utf-8") for line in iter(mm.readline, b""))
+                return
+
+        with path.open("r", encoding="utf-8", newline="") as f:
+            yield f
+
     def to_csv(self, path: Path) -> None:
         """
         Save the current VFS state to a CSV file.
@@ -120,25 +358,36 @@ class Vfs:
             VfsSaveError on failure.
         """
         try:
-            if path.parent:
+            # Path("x.csv").parent is Path("."), which always exists.
+            if path.parent != Path("."):
                 path.parent.mkdir(parents=True, exist_ok=True)
 
+            # Build the whole CSV in memory and write it with a single call
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(["path", "type", "content_base64"])
+            writer.writerows(self._csv_rows())
+
             with path.open("w", encoding="utf-8", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow(["path", "type", "content_base64"])
-                self._write_node_recursive(writer, self.root, current_path="/")
+                f.write(buf.getvalue())
         except Exception as e:
             raise VfsSaveError(f"Failed to save VFS to CSV '{path}': {e}") from e
 
     @staticmethod
     def _insert_row(
-        root: VfsNode,
+        dir_stack: List[Tuple[str, VfsNode]],
         raw_path: str,
         node_type: str,
         content_b64: str,
     ) -> None:
         """
         Insert a single row from CSV into the VFS tree.
+
+        `dir_stack` holds (name, node) pairs for the parent directories of
+        the previously inserted row, starting with ("", root). Rows usually
+        share most of their parent directories with the row before them
+        (to_csv writes them in tree order), so only the part of the path
+        that differs is walked. The stack is updated for the next row.
         """
         # Normalize path
         if not raw_path.startswith("/"):
@@ -155,70 +404,118 @@ class Vfs:
         if not parts:
             raise VfsLoadError(f"Invalid path '{raw_path}'")
 
-        # Walk directories
-        current = root
-        for part in parts[:-1]:
+        # Reuse the directories shared with the previous row's path
+        depth = len(parts) - 1
+        limit = min(depth, len(dir_stack) - 1)
+        common = 0
+        while common < limit and dir_stack[common + 1][0] == parts[common]:
+            common += 1
+        del dir_stack[common + 1:]
+
+        # Walk the remaining directories
+        current = dir_stack[-1][1]
+        for part in parts[common:depth]:
             current = current.ensure_child_dir(part)
+            dir_stack.append((part, current))
 
         leaf_name = parts[-1]
 
         if node_type == "dir":
             current.ensure_child_dir(leaf_name)
         elif node_type == "file":
-            try:
-                content = base64.b64decode(content_b64.encode("ascii"))
-            except Exception as e:
+            # Decoding is deferred until the content is first read (see
+            # VfsNode.content); only the cheap ASCII check is done here.
+            if not content_b64.isascii():
                 raise VfsLoadError(
-                    f"Invalid base64 content for '{raw_path}': {e}"
-                ) from e
-            current.set_file(leaf_name, content)
+                    f"Invalid base64 content for '{raw_path}': "
+                    f"string argument should contain only ASCII characters"
+                )
+            # Keep the text from the CSV so an unchanged file is saved
+            # without being encoded again
+            current.set_file(leaf_name, None, content_b64.strip())
         else:
             raise VfsLoadError(
                 f"Invalid node type '{node_type}' for path '{raw_path}' "
                 f"(expected 'dir' or 'file')"
             )
 
-    def _write_node_recursive(
-        self,
-        writer: csv.writer,
-        node: VfsNode,
-        current_path: str,
-    ) -> None:
+    def _walk(self) -> List[Tuple[str, VfsNode]]:
         """
-        Recursively write `node` and its children as CSV rows.
+        Return (path, node) for every node, parents before children and
+        children sorted by name.
+
+        Uses an explicit stack instead of recursion.
         """
-        # Write this node
-        if current_path == "/":
-            writer.writerow([current_path, "dir", ""])
-        else:
-            if node.is_dir:
-                writer.writerow([current_path, "dir", ""])
-            else:
-                content_b64 = base64.b64encode(node.content).decode("ascii")
-                writer.writerow([current_path, "file", content_b64])
+        entries: List[Tuple[str, VfsNode]] = []
+        stack: List[Tuple[VfsNode, str]] = [(self.root, "/")]
+        while stack:
+            node, current_path = stack.pop()
+            entries.append((current_path, node))
 
-        if not node.is_dir:
-            return
+            if not node.is_dir:
+                continue
+
+            prefix = "" if current_path == "/" else current_path
+            # Pushed in reverse so that children are popped in sorted order
+            for child_name in reversed(node.sorted_child_names()):
+                stack.append(
+                    (node.children[child_name], f"{prefix}/{child_name}")
+                )
+        return entries
 
-        # Recurse into children (directories first, then files, just for readability)
-        for child_name, child_node in sorted(node.children.items()):
-            if current_path == "/":
-                child_path = f"/{child_name}"
-            else:
-                child_path = f"{current_path}/{child_name}"
-            self._write_node_recursive(writer, child_node, child_path)
+    def _csv_rows(self) -> List[Tuple[str, str, str]]:
+        """
+        Build the CSV rows (path, type, content_base64) for every node.
+        """
+        entries = self._walk()
+
+        # Encode all files without a cached encoding in one tight loop,
+        # separate from assembling the rows.
+        missing = [
+            node
+            for _, node in entries
+            if not node.is_dir and node._content_b64 is None
+        ]
+        encoded = [
+            base64.b64encode(node.content).decode("ascii") for node in missing
+        ]
+        for node, content_b64 in zip(missing, encoded):
+            node._content_b64 = content_b64
+
+        return [
+            (current_path, "dir", "")
+            if node.is_dir
+            else (current_path, "file", node._content_b64 or "")
+            for current_path, node in entries
+        ]
 
     # ----------- Stage 4 helpers: ls / cd / du -----------
 
+    def _index(self) -> Dict[str, VfsNode]:
+        """
+        Return the path -> node index, rebuilding it first if any node
+        was added or replaced since it was built.
+        """
+        version = self.root._tree.version
+        if self._indexed_version != version:
+            self._by_path = dict(self._walk())
+            self._indexed_version = version
+        return self._by_path
+
     def find_node(self, abs_path: str) -> Optional[VfsNode]:
         """
         Find a node by absolute path (e.g. '/', '/docs', '/docs/readme.txt').
 
+        Normalized paths are looked up in the path index, which is rebuilt
+        after any change to the tree; anything else (e.g. '/docs/') falls
+        back to walking the tree.
+
         Returns:
             VfsNode if found, otherwise None.
         """
-        if abs_path == "/":
-            return self.root
+        node = self._index().get(abs_path)
+        if node is not None:
+            return node
 
         if not abs_path.startswith("/"):
             # For simplicity we require absolute paths here.
@@ -250,7 +547,7 @@ class Vfs:
         if not node.is_dir:
             raise NotADirectoryError(f"Not a directory: {abs_path}")
         # Return children sorted by name
-        return [node.children[name] for name in sorted(node.children.keys())]
+        return [node.children[name] for name in node.sorted_child_names()]
 
     def compute_size(self, abs_path: str) -> int:
         """
@@ -262,9 +559,14 @@ class Vfs:
         return self._compute_node_size(node)
 
     def _compute_node_size(self, node: VfsNode) -> int:
+        # Sizes are cached on the nodes, so unchanged subtrees are not walked again
+        if node._size is not None:
+            return node._size
         if not node.is_dir:
-            return len(node.content)
-        total = 0
-        for child in node.children.values():
-            total += self._compute_node_size(child)
+            total = node.content_size()
+        else:
+            total = 0
+            for child in node.children.values():
+                total += self._compute_node_size(child)
+        node._size = total
         return total